@@ -0,0 +1,153 @@
+"""
+Posting-list index over node metadata
+Maps (field, value) -> node ids so query filters can prefilter the
+candidate set before similarity scoring
+"""
+
+import json
+import logging
+import os
+from datetime import datetime
+
+logger = logging.getLogger("attribute-index")
+
+ATTRIBUTE_FILE = "attribute_index.json"
+
+# Categorical metadata fields with posting lists
+FILTER_FIELDS = ("source", "doc_type", "product")
+
+
+def _normalize(value) -> str:
+    return str(value).strip().lower()
+
+
+def _parse_timestamp(value):
+    """Unix timestamp from a number or ISO date string, None if unparseable"""
+    if isinstance(value, (int, float)):
+        return float(value)
+    value = str(value).strip()
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        return None
+
+
+def _as_list(value):
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple, set)):
+        return [v for v in value if v not in (None, "")]
+    return [v for v in str(value).split(",") if v.strip()]
+
+
+class AttributeIndex:
+    """
+    Inverted index: field -> value -> node ids
+
+    Args:
+        postings: {field: {value: [node_id, ...]}}
+        uploaded_at: {node_id: unix timestamp}
+    """
+
+    def __init__(self, postings=None, uploaded_at=None) -> None:
+        self.postings = {
+            field: {value: set(ids) for value, ids in values.items()}
+            for field, values in (postings or {}).items()
+        }
+        self.uploaded_at = dict(uploaded_at or {})
+
+    @classmethod
+    def from_nodes(cls, nodes) -> "AttributeIndex":
+        """Build postings from node metadata (source, doc_type, products, uploaded_at)"""
+        index = cls()
+        index.add_nodes(nodes)
+        return index
+
+    def add_nodes(self, nodes) -> None:
+        for node in nodes:
+            metadata = node.metadata
+            self._add(node.node_id, "source", metadata.get("source"))
+            self._add(node.node_id, "doc_type", metadata.get("doc_type"))
+            for product in _as_list(metadata.get("products")):
+                self._add(node.node_id, "product", product)
+            if metadata.get("uploaded_at") is not None:
+                self.uploaded_at[node.node_id] = float(metadata["uploaded_at"])
+
+    def remove(self, node_ids) -> None:
+        node_ids = set(node_ids)
+        for values in self.postings.values():
+            for value in list(values):
+                values[value] -= node_ids
+                if not values[value]:
+                    del values[value]
+        for node_id in node_ids:
+            self.uploaded_at.pop(node_id, None)
+
+    def _add(self, node_id: str, field: str, value) -> None:
+        if value in (None, ""):
+            return
+        self.postings.setdefault(field, {}).setdefault(_normalize(value), set()).add(node_id)
+
+    def values(self, field: str):
+        """Known values for a field (useful for tool descriptions)"""
+        return sorted(self.postings.get(field, {}))
+
+    def candidates(self, filters: dict):
+        """
+        Node ids matching all filters
+
+        Args:
+            filters: {"source" | "doc_type" | "product": value or list of values,
+                      "uploaded_after": ISO date or unix timestamp}
+                     Values within a field are OR-ed, fields are AND-ed.
+
+        Returns:
+            set or None: Matching node ids, or None if no filter was given
+        """
+        result = None
+        for field in FILTER_FIELDS:
+            values = _as_list(filters.get(field))
+            if not values:
+                continue
+            field_postings = self.postings.get(field, {})
+            matched = set()
+            for value in values:
+                matched |= field_postings.get(_normalize(value), set())
+            result = matched if result is None else result & matched
+
+        uploaded_after = filters.get("uploaded_after")
+        if uploaded_after:
+            timestamp = _parse_timestamp(uploaded_after)
+            if timestamp is None:
+                # Spoken dates ("last week") are not ISO dates, skip just this filter
+                logger.warning(f"Ignoring uploaded_after filter, not a date: {uploaded_after!r}")
+            else:
+                matched = {n for n, ts in self.uploaded_at.items() if ts >= timestamp}
+                result = matched if result is None else result & matched
+
+        return result
+
+    def persist(self, persist_dir: str) -> None:
+        data = {
+            "postings": {
+                field: {value: sorted(ids) for value, ids in values.items()}
+                for field, values in self.postings.items()
+            },
+            "uploaded_at": self.uploaded_at,
+        }
+        with open(os.path.join(persist_dir, ATTRIBUTE_FILE), "w", encoding="utf-8") as f:
+            json.dump(data, f)
+
+    @classmethod
+    def load(cls, persist_dir: str) -> "AttributeIndex":
+        with open(os.path.join(persist_dir, ATTRIBUTE_FILE), "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data.get("postings"), data.get("uploaded_at"))
+
+    @staticmethod
+    def exists(persist_dir: str) -> bool:
+        return os.path.exists(os.path.join(persist_dir, ATTRIBUTE_FILE))
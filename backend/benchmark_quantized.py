@@ -0,0 +1,98 @@
+"""
+Benchmark quantized vs full-precision vector search
+Reports recall@k, resident memory (codes + node ids, checked with
+tracemalloc) and per-query latency
+
+Usage:
+    python benchmark_quantized.py                  # use ./storage embeddings
+    python benchmark_quantized.py --synthetic 50000
+"""
+
+import argparse
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+from quantized_index import QUANT_MODES, QuantizedVectorIndex, normalize, load_embedding_dict
+
+
+def exact_search(vectors, query, top_k):
+    scores = vectors @ query
+    return np.argsort(-scores)[:top_k]
+
+
+def run(embedding_dict, top_k=5, n_queries=200, rescore_multiplier=8, seed=0):
+    rng = np.random.default_rng(seed)
+    node_ids = list(embedding_dict.keys())
+    vectors = normalize(np.asarray([embedding_dict[n] for n in node_ids], dtype=np.float32))
+    top_k = min(top_k, len(node_ids))
+
+    # Queries: perturbed copies of stored vectors (no embedding API calls)
+    picks = rng.integers(0, len(node_ids), size=n_queries)
+    queries = normalize(vectors[picks] + rng.normal(0, 0.05, size=(n_queries, vectors.shape[1])).astype(np.float32))
+
+    start = time.perf_counter()
+    truth = [set(exact_search(vectors, q, top_k).tolist()) for q in queries]
+    float_latency = (time.perf_counter() - start) / n_queries
+
+    # Every index also holds the node ids, count them for float32 too
+    float_bytes = vectors.nbytes + np.asarray([n.encode("utf-8") for n in node_ids]).nbytes
+
+    print(f"Vectors: {len(node_ids)} x {vectors.shape[1]}, top_k={top_k}, queries={n_queries}")
+    print("-" * 74)
+    print(
+        f"{'index':<10}{'recall@k':>10}{'memory (KB)':>14}{'measured (KB)':>15}"
+        f"{'reduction':>11}{'latency (ms)':>14}"
+    )
+    print(
+        f"{'float32':<10}{1.0:>10.3f}{float_bytes / 1024:>14.1f}{'-':>15}"
+        f"{'1.0x':>11}{float_latency * 1000:>14.3f}"
+    )
+
+    row_of = {n: i for i, n in enumerate(node_ids)}
+    for mode in QUANT_MODES:
+        with tempfile.TemporaryDirectory() as tmp:
+            QuantizedVectorIndex.build(embedding_dict, tmp, mode=mode)
+
+            # Heap actually held by a freshly loaded index (the memmap is not counted)
+            tracemalloc.start()
+            index = QuantizedVectorIndex.load(tmp)
+            measured = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+
+            start = time.perf_counter()
+            results = [index.search(q, top_k=top_k, rescore_multiplier=rescore_multiplier) for q in queries]
+            latency = (time.perf_counter() - start) / n_queries
+
+            hits = sum(len(truth[i] & {row_of[n] for n, _ in res}) for i, res in enumerate(results))
+            recall = hits / (top_k * n_queries)
+            reduction = float_bytes / max(index.resident_bytes, measured)
+            print(
+                f"{mode:<10}{recall:>10.3f}{index.resident_bytes / 1024:>14.1f}{measured / 1024:>15.1f}"
+                f"{f'{reduction:.1f}x':>11}{latency * 1000:>14.3f}"
+            )
+            del index
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Quantized index benchmark")
+    parser.add_argument("--persist-dir", default="./storage")
+    parser.add_argument("--synthetic", type=int, default=0, help="Use N random 768-d vectors instead")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--rescore-multiplier", type=int, default=8)
+    args = parser.parse_args()
+
+    if args.synthetic:
+        rng = np.random.default_rng(0)
+        data = rng.normal(size=(args.synthetic, 768)).astype(np.float32)
+        embeddings = {f"node-{i}": v for i, v in enumerate(data)}
+    else:
+        embeddings = load_embedding_dict(args.persist_dir)
+
+    print("=" * 60)
+    print("Quantized Embedding Benchmark")
+    print("=" * 60)
+    run(embeddings, top_k=args.top_k, n_queries=args.queries, rescore_multiplier=args.rescore_multiplier)
@@ -0,0 +1,157 @@
+"""
+Process-wide pool of API clients shared across agent sessions
+The agents run their jobs as threads of one worker process
+(JobExecutorType.THREAD), so clients without event-loop state (realtime
+model, VAD weights, the RAG layer's Gemini clients and their keep-alive
+connections) are created once, in prewarm_fnc, and reused by every session.
+Clients bound to a job's event loop (aiohttp-based STT/TTS) get a traced
+keep-alive session per loop, so connection setup and reuse are counted
+process-wide
+"""
+
+import asyncio
+import logging
+import threading
+import time
+
+import aiohttp
+
+logger = logging.getLogger("client-pool")
+
+HTTP_KEEPALIVE_SECONDS = 60
+HTTP_CONNECTION_LIMIT = 100
+
+
+class ClientPool:
+    """
+    Lazily-created, process-wide API clients
+
+    Usage:
+        vad = pool.get("silero_vad", silero.VAD.load)
+        stt = deepgram.STT(http_session=pool.http_session())
+    """
+
+    def __init__(self) -> None:
+        self._clients = {}
+        self._http_sessions = {}
+        # Jobs call in from their own threads
+        self._lock = threading.Lock()
+        self._warm_lock = threading.Lock()
+        self.client_metrics = {}
+        self.connection_metrics = {
+            "created": 0,
+            "reused": 0,
+            "setup_ms_total": 0.0,
+            "warmup_ms": {},
+        }
+
+    def get(self, name: str, factory):
+        """
+        Return the pooled client, creating it on first use
+
+        Args:
+            name: Pool key
+            factory: Zero-argument callable building the client; the client
+                     must not hold event-loop state (it is used from every job)
+
+        Returns:
+            The shared client instance
+        """
+        with self._lock:
+            if name in self._clients:
+                self.client_metrics[name]["reused"] += 1
+                return self._clients[name]
+
+            client = factory()
+            self._clients[name] = client
+            self.client_metrics[name] = {"created_at": time.time(), "reused": 0}
+            logger.info(f"Created shared {name} client")
+            return client
+
+    def warm(self, name: str, open_fn) -> None:
+        """
+        Open a connection once per process, ahead of the first session
+
+        Args:
+            name: Connection name (reported under warmup_ms)
+            open_fn: Blocking call that opens the connection the clients reuse
+        """
+        with self._warm_lock:
+            if name in self.connection_metrics["warmup_ms"]:
+                return
+            start = time.perf_counter()
+            try:
+                open_fn()
+            except Exception as e:
+                logger.warning(f"Connection warmup for {name} failed: {e}")
+                return
+            warmup_ms = (time.perf_counter() - start) * 1000
+            with self._lock:
+                self.connection_metrics["warmup_ms"][name] = round(warmup_ms, 1)
+            logger.info(f"Warmed {name} connection in {warmup_ms:.1f} ms")
+
+    def _count(self, key: str, setup_ms: float = None) -> None:
+        with self._lock:
+            self.connection_metrics[key] += 1
+            if setup_ms is not None:
+                self.connection_metrics["setup_ms_total"] += setup_ms
+
+    def _trace_config(self) -> aiohttp.TraceConfig:
+        trace = aiohttp.TraceConfig()
+
+        async def on_create_start(session, ctx, params):
+            ctx.start = time.perf_counter()
+
+        async def on_create_end(session, ctx, params):
+            self._count("created", (time.perf_counter() - ctx.start) * 1000)
+
+        async def on_reuse(session, ctx, params):
+            self._count("reused")
+
+        trace.on_connection_create_start.append(on_create_start)
+        trace.on_connection_create_end.append(on_create_end)
+        trace.on_connection_reuseconn.append(on_reuse)
+        return trace
+
+    def http_session(self) -> aiohttp.ClientSession:
+        """Traced keep-alive aiohttp session for the running event loop (one per job)"""
+        loop = asyncio.get_running_loop()
+        session = self._http_sessions.get(loop)
+        if session is None or session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=HTTP_CONNECTION_LIMIT,
+                keepalive_timeout=HTTP_KEEPALIVE_SECONDS,
+                ttl_dns_cache=300,
+            )
+            session = aiohttp.ClientSession(connector=connector, trace_configs=[self._trace_config()])
+            self._http_sessions[loop] = session
+        return session
+
+    def stats(self, since: float = None) -> dict:
+        """
+        Client reuse and connection reuse metrics for this process
+
+        Args:
+            since: If given (e.g. job start time), also report which clients
+                   were already created before it (setup not paid by the job)
+        """
+        with self._lock:
+            clients = {}
+            for name, metrics in self.client_metrics.items():
+                clients[name] = {"reused": metrics["reused"]}
+                if since is not None:
+                    clients[name]["prewarmed"] = metrics["created_at"] < since
+            connections = dict(self.connection_metrics)
+            connections["setup_ms_total"] = round(connections["setup_ms_total"], 1)
+            connections["warmup_ms"] = dict(connections["warmup_ms"])
+        return {"clients": clients, "connections": connections}
+
+    async def aclose(self) -> None:
+        """Close the running loop's HTTP session (job shutdown); shared clients stay"""
+        session = self._http_sessions.pop(asyncio.get_running_loop(), None)
+        if session is not None and not session.closed:
+            await session.close()
+
+
+# Shared by every session in this process and by the RAG layer
+pool = ClientPool()
@@ -0,0 +1,272 @@
+"""
+Conversation context compaction for long calls
+Keeps a token-budgeted window of the chat history sent to the model:
+recent turns verbatim, older turns summarized, stale tool outputs dropped.
+Realtime models keep their context on the server, so for them the budget
+configures the model's own sliding-window compression instead
+"""
+
+import logging
+from dataclasses import dataclass
+from typing import List, Optional
+
+from livekit.agents import llm
+
+logger = logging.getLogger("context-manager")
+
+# Rough estimate used by Gemini tokenizers for English text
+CHARS_PER_TOKEN = 4
+
+SUMMARY_PREFIX = "Summary of the earlier conversation:"
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (no tokenizer call on the hot path)"""
+    if not text:
+        return 0
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def _item_text(item) -> str:
+    """Plain text of any chat context item"""
+    if item.type == "message":
+        return item.text_content or ""
+    if item.type == "function_call":
+        return f"{item.name}({item.arguments})"
+    if item.type == "function_call_output":
+        return item.output or ""
+    return ""
+
+
+def _clip(text: str, max_chars: int) -> str:
+    text = " ".join(text.split())
+    if len(text) <= max_chars:
+        return text
+    return text[: max_chars - 3].rstrip() + "..."
+
+
+def _tool_call_units(items) -> List[List]:
+    """Group items so each function_call travels with its outputs"""
+    units = []
+    calls = {}
+    for item in items:
+        if item.type == "function_call_output" and item.call_id in calls:
+            calls[item.call_id].append(item)
+            continue
+        unit = [item]
+        if item.type == "function_call":
+            calls[item.call_id] = unit
+        units.append(unit)
+    # An output whose call is not in the window would reach the model orphaned
+    return [u for u in units if not (len(u) == 1 and u[0].type == "function_call_output")]
+
+
+@dataclass
+class ContextBudget:
+    """
+    Per-agent context window settings
+
+    Args:
+        max_tokens: Compact once the estimated prompt exceeds this size
+        keep_recent_turns: Number of most recent user turns kept verbatim
+        max_tool_output_chars: Tool outputs inside the recent window are clipped to this
+        summary_line_chars: Each older message is clipped to this in the summary
+        summary_max_chars: Total size of the running summary
+        target_tokens: Realtime models only, size the server-side window shrinks to
+    """
+    max_tokens: int = 4000
+    keep_recent_turns: int = 6
+    max_tool_output_chars: int = 1500
+    summary_line_chars: int = 160
+    summary_max_chars: int = 1600
+    target_tokens: int = 2000
+
+
+@dataclass
+class ContextMetrics:
+    """Prompt-size metrics for a single turn"""
+    turn: int
+    items_before: int
+    items_after: int
+    tokens_before: int
+    tokens_after: int
+    compacted: bool
+
+
+class ContextWindowManager:
+    """
+    Token-budgeted chat history window
+
+    Usage:
+        window = ContextWindowManager(ContextBudget(max_tokens=3000))
+        chat_ctx = window.maybe_compact(chat_ctx) or chat_ctx
+    """
+
+    def __init__(self, budget: Optional[ContextBudget] = None, name: str = "agent") -> None:
+        self.budget = budget or ContextBudget()
+        self.name = name
+        self.turn = 0
+        self.last_metrics: Optional[ContextMetrics] = None
+
+    def count_tokens(self, items) -> int:
+        return sum(estimate_tokens(_item_text(item)) for item in items)
+
+    def maybe_compact(self, chat_ctx: llm.ChatContext) -> Optional[llm.ChatContext]:
+        """
+        Compact the chat context if it is over budget
+
+        Args:
+            chat_ctx: The full chat context for this turn
+
+        Returns:
+            ChatContext or None: A new compacted context, or None if under budget
+        """
+        self.turn += 1
+        items = list(chat_ctx.items)
+        tokens_before = self.count_tokens(items)
+
+        compacted = None
+        new_items = items
+        if tokens_before > self.budget.max_tokens:
+            new_items = self._compact_items(items)
+            compacted = llm.ChatContext(items=new_items)
+
+        self.last_metrics = ContextMetrics(
+            turn=self.turn,
+            items_before=len(items),
+            items_after=len(new_items),
+            tokens_before=tokens_before,
+            tokens_after=self.count_tokens(new_items),
+            compacted=compacted is not None,
+        )
+        logger.info(
+            f"[{self.name}] turn {self.turn} prompt ~{self.last_metrics.tokens_after} tokens "
+            f"({self.last_metrics.items_after} items)"
+            + (f", compacted from ~{tokens_before} tokens ({len(items)} items)" if compacted else "")
+        )
+        return compacted
+
+    def _compact_items(self, items: List) -> List:
+        budget = self.budget
+
+        # Instructions are always kept as-is
+        system_items = [
+            i for i in items
+            if i.type == "message" and i.role in ("system", "developer")
+            and not (i.text_content or "").startswith(SUMMARY_PREFIX)
+        ]
+        system_ids = {id(i) for i in system_items}
+        history = [i for i in items if id(i) not in system_ids]
+
+        # Recent window starts at the Nth most recent user message
+        split = 0
+        user_turns = 0
+        for idx in range(len(history) - 1, -1, -1):
+            item = history[idx]
+            if item.type == "message" and item.role == "user":
+                user_turns += 1
+                if user_turns >= budget.keep_recent_turns:
+                    split = idx
+                    break
+
+        older, recent = history[:split], history[split:]
+
+        # Older turns: summarize messages, drop tool calls and their outputs
+        summary_lines = []
+        for item in older:
+            if item.type != "message":
+                continue
+            text = item.text_content or ""
+            if text.startswith(SUMMARY_PREFIX):
+                summary_lines.extend(
+                    line for line in text[len(SUMMARY_PREFIX):].splitlines() if line.strip()
+                )
+                continue
+            if text.strip():
+                summary_lines.append(f"- {item.role}: {_clip(text, budget.summary_line_chars)}")
+
+        # Keep the newest lines when the summary itself is over its budget
+        summary_text = ""
+        for line in reversed(summary_lines):
+            if len(summary_text) + len(line) + 1 > budget.summary_max_chars:
+                break
+            summary_text = line + "\n" + summary_text
+
+        # Recent turns: verbatim, except bulky tool outputs are clipped
+        clipped_recent = []
+        for item in recent:
+            if item.type == "function_call_output" and len(item.output or "") > budget.max_tool_output_chars:
+                item = item.model_copy(update={"output": _clip(item.output, budget.max_tool_output_chars)})
+            clipped_recent.append(item)
+
+        new_items = list(system_items)
+        if summary_text:
+            new_items.append(
+                llm.ChatMessage(role="system", content=[f"{SUMMARY_PREFIX}\n{summary_text.rstrip()}"])
+            )
+
+        # Still over budget: drop the oldest recent items, never the last user turn
+        # (its message and everything after it), and a tool call only with its outputs
+        last_user = max(
+            (idx for idx, item in enumerate(clipped_recent) if item.type == "message" and item.role == "user"),
+            default=0,
+        )
+        units = _tool_call_units(clipped_recent[:last_user])
+        kept = clipped_recent[last_user:]
+        tokens = self.count_tokens(new_items) + self.count_tokens(kept) + sum(
+            self.count_tokens(unit) for unit in units
+        )
+        while units and tokens > budget.max_tokens:
+            dropped = units.pop(0)
+            tokens -= self.count_tokens(dropped)
+            logger.debug(f"[{self.name}] dropped {[item.type for item in dropped]} from context window")
+
+        return new_items + [item for unit in units for item in unit] + kept
+
+
+def realtime_compression(budget: ContextBudget):
+    """
+    Sliding-window compression config for a Gemini Live RealtimeModel
+
+    The server drops the oldest turns once the session reaches
+    budget.max_tokens, down to budget.target_tokens.
+    """
+    from google.genai import types
+
+    return types.ContextWindowCompressionConfig(
+        trigger_tokens=budget.max_tokens,
+        sliding_window=types.SlidingWindow(target_tokens=budget.target_tokens),
+    )
+
+
+class RealtimeContextMonitor:
+    """
+    Per-turn prompt-size logging for realtime sessions, from the model's usage events
+
+    Usage:
+        monitor = RealtimeContextMonitor(budget, name="gemini-live")
+        session.on("metrics_collected", monitor.on_metrics_collected)
+    """
+
+    def __init__(self, budget: ContextBudget, name: str = "agent") -> None:
+        self.budget = budget
+        self.name = name
+        self.turn = 0
+        self.last_input_tokens = 0
+
+    def on_metrics_collected(self, ev) -> None:
+        metrics = ev.metrics
+        if metrics.type != "realtime_model_metrics":
+            return
+
+        self.turn += 1
+        details = metrics.input_token_details
+        # The server compresses at trigger_tokens, a drop here means it did
+        compressed = metrics.input_tokens < self.last_input_tokens
+        self.last_input_tokens = metrics.input_tokens
+        logger.info(
+            f"[{self.name}] turn {self.turn} prompt {metrics.input_tokens} tokens "
+            f"(audio {details.audio_tokens}, text {details.text_tokens}, cached {details.cached_tokens}), "
+            f"window {self.budget.max_tokens} -> {self.budget.target_tokens}"
+            + (", compressed by server" if compressed else "")
+        )
@@ -3,19 +3,28 @@ Complete Gemini Live Agent with RAG using Function Calling
 Combines: Gemini Live API + LlamaIndex RAG + LiveKit
 """
 
+import asyncio
 import logging
 import os
+import time
+from typing import Optional
 from dotenv import load_dotenv
 from livekit.agents import (
     Agent,
     AgentSession,
     JobContext,
+    JobExecutorType,
+    JobProcess,
     WorkerOptions,
     cli,
+    function_tool,
     llm,
 )
 from livekit.plugins import google
-from rag_llamaindex import query_docs, build_index
+from client_pool import pool
+from load_control import JobLoadMonitor, LoadLimits, WorkerLoad
+from rag_llamaindex import query_docs, gemini_embedding, get_local_handle, snapshot_loader
+from context_manager import ContextBudget, RealtimeContextMonitor, realtime_compression
 
 # Load environment
 load_dotenv()
@@ -24,36 +33,29 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("gemini-rag-agent")
 
+# Worker capacity limits (AGENT_MAX_SESSIONS, AGENT_MAX_LOOP_LAG_MS, ... in .env)
+load_limits = LoadLimits.from_env()
 
-# Define the RAG tool for Gemini
-def create_rag_tool():
-    """Create the query_docs tool definition for Gemini"""
-    from google.genai import types
-    
-    return types.Tool(
-        function_declarations=[
-            types.FunctionDeclaration(
-                name="query_docs",
-                description="Search and retrieve information from uploaded documents. Use this tool when the user asks questions about their documents.",
-                parameters=types.Schema(
-                    type=types.Type.OBJECT,
-                    properties={
-                        "query": types.Schema(
-                            type=types.Type.STRING,
-                            description="The search query or question to look up in the uploaded documents"
-                        )
-                    },
-                    required=["query"]
-                )
-            )
-        ]
+# Gemini Live keeps the session context on the server; it slides the window
+# itself once a long call (query_docs results are the bulk of it) reaches max_tokens
+context_budget = ContextBudget(max_tokens=24000, target_tokens=12000)
+
+
+def create_realtime_model():
+    """Gemini Live RealtimeModel (options only, each session opens its own connection)"""
+    return google.realtime.RealtimeModel(
+        model="gemini-2.5-flash-native-audio-preview-12-2025",
+        voice="Puck",
+        temperature=0.8,
+        context_window_compression=realtime_compression(context_budget),
     )
 
 
 class GeminiRAGAssistant(Agent):
     """Voice Assistant with RAG using Gemini Live API"""
     
-    def __init__(self) -> None:
+    def __init__(self, load_monitor: JobLoadMonitor) -> None:
+        self.load_monitor = load_monitor
         instructions = """
 You are a helpful and friendly AI voice assistant for TechVision company.
 
@@ -71,62 +73,132 @@ You help customers with questions about:
 - Company information
 """
         
-        # Use Gemini Live API RealtimeModel (بدون tools)
-        realtime_model = google.realtime.RealtimeModel(
-            model="gemini-2.5-flash-native-audio-preview-12-2025",
-            voice="Puck",
-            temperature=0.8,
-        )
+        # Use Gemini Live API RealtimeModel (query_docs is registered on the agent)
+        realtime_model = pool.get("gemini_realtime", create_realtime_model)
         
         super().__init__(
             instructions=instructions,
             llm=realtime_model,
         )
     
-    async def on_function_call(self, function_name: str, arguments: dict) -> str:
-        """Handle function calls from Gemini"""
-        logger.info(f" Function called: {function_name}")
-        logger.info(f"Arguments: {arguments}")
+    @function_tool
+    async def query_docs(
+        self,
+        query: str,
+        product: Optional[str] = None,
+        source: Optional[str] = None,
+        doc_type: Optional[str] = None,
+        uploaded_after: Optional[str] = None,
+    ) -> str:
+        """Search and retrieve information from uploaded documents. Use this tool when the user asks questions about their documents.
+
+        Args:
+            query: The search query or question to look up in the uploaded documents
+            product: Optional: only search content about this product, e.g. CloudSync Pro, DataGuard, TeamConnect
+            source: Optional: only search this uploaded file name
+            doc_type: Optional: only search this file type (pdf, txt, docx, md)
+            uploaded_after: Optional: only search documents uploaded after this ISO date (YYYY-MM-DD)
+        """
+        logger.info(" Function called: query_docs")
+        logger.info(f"Arguments: query={query!r}, product={product!r}, source={source!r}, "
+                    f"doc_type={doc_type!r}, uploaded_after={uploaded_after!r}")
         
-        if function_name == "query_docs":
-            query = arguments.get("query", "")
-            result = query_docs(query)
-            logger.info(f"RAG returned result: {result[:100]}...")
-            return result
+        # Under pressure, skip LLM synthesis and answer from retrieved passages
+        retrieval_only = self.load_monitor.should_shed_rag()
+        if retrieval_only:
+            logger.warning("Worker under load - RAG synthesis skipped")
         
-        return "Function not found"
+        # Retrieval and synthesis block, keep them off the audio event loop
+        with self.load_monitor.track_rag_query():
+            result = await asyncio.to_thread(
+                query_docs,
+                query,
+                source=source,
+                doc_type=doc_type,
+                product=product,
+                uploaded_after=uploaded_after,
+                retrieval_only=retrieval_only,
+            )
+        logger.info(f"RAG returned result: {result[:100]}...")
+        return result
+
+
+async def watch_snapshots():
+    """Poll the shared snapshot directory and swap in new index versions"""
+    while True:
+        await asyncio.sleep(snapshot_loader.poll_interval)
+        try:
+            # Every job runs a watcher; skip the poll if another job's is refreshing
+            await asyncio.to_thread(snapshot_loader.refresh, False)
+        except Exception as e:
+            logger.warning(f"Snapshot refresh failed: {e}")
+
+
+def prewarm(proc: JobProcess):
+    """Create the realtime model and open the RAG Gemini connection once per worker process"""
+    pool.get("gemini_realtime", create_realtime_model)
+    # The RAG clients are shared by every session: their first request pays DNS + TLS
+    pool.warm("gemini_rag", lambda: gemini_embedding.get_text_embedding("warmup"))
 
 
 async def entrypoint(ctx: JobContext):
     """Main entry point for the agent"""
     
+    job_started = time.time()
     logger.info(f"Connecting to room: {ctx.room.name}")
+    ctx.add_shutdown_callback(pool.aclose)
+    
+    # Report this job's event-loop lag / RAG load to the worker
+    load_monitor = JobLoadMonitor(load_limits)
+    await load_monitor.start()
+    ctx.add_shutdown_callback(load_monitor.aclose)
     
     # Connect to the room FIRST
     await ctx.connect()
     logger.info("Connected to room")
     
-    # Build RAG index (non-blocking)
-    logger.info("Checking RAG index...")
-    try:
-        index = build_index()
-        if index:
-            logger.info("RAG system ready with documents")
+    if snapshot_loader is not None:
+        # Query node: serve the newest published snapshot and hot-swap new ones
+        logger.info("Loading RAG index snapshot...")
+        await asyncio.to_thread(snapshot_loader.refresh)
+        if snapshot_loader.version:
+            logger.info(f"RAG system ready with snapshot {snapshot_loader.version}")
         else:
-            logger.info("No documents uploaded - waiting for uploads")
-    except Exception as e:
-        logger.warning(f"RAG index check: {e}")
+            logger.info("No index snapshot published yet - waiting for ingestion")
+        watcher = asyncio.create_task(watch_snapshots())
+        
+        async def stop_watcher():
+            watcher.cancel()
+        
+        ctx.add_shutdown_callback(stop_watcher)
+    else:
+        # Load (or build) the serving handle off the event loop; with quantization
+        # this never parses the float vector store
+        logger.info("Checking RAG index...")
+        try:
+            handle = await asyncio.to_thread(get_local_handle)
+            if handle:
+                logger.info("RAG system ready with documents")
+            else:
+                logger.info("No documents uploaded - waiting for uploads")
+        except Exception as e:
+            logger.warning(f"RAG index check: {e}")
     
     # Create agent session
     session = AgentSession()
     
+    # Per-turn prompt size, as reported by the model
+    context_monitor = RealtimeContextMonitor(context_budget, name="gemini-rag")
+    session.on("metrics_collected", context_monitor.on_metrics_collected)
+    
     # Start the session
     await session.start(
         room=ctx.room,
-        agent=GeminiRAGAssistant()
+        agent=GeminiRAGAssistant(load_monitor=load_monitor)
     )
     
     logger.info("Gemini RAG voice assistant ready!")
+    logger.info(f"Client pool (this worker process): {pool.stats(since=job_started)}")
     logger.info("Users can upload documents and ask questions")
 
 
@@ -167,8 +239,15 @@ if __name__ == "__main__":
     print()
     
     # Run the agent
+    worker_load = WorkerLoad(load_limits)
     cli.run_app(
         WorkerOptions(
-            entrypoint_fnc=entrypoint
+            entrypoint_fnc=entrypoint,
+            prewarm_fnc=prewarm,
+            # Jobs share this process, and with it the client pool
+            job_executor_type=JobExecutorType.THREAD,
+            request_fnc=worker_load.request_fnc,
+            load_fnc=worker_load.compute_load,
+            load_threshold=load_limits.load_threshold,
         )
     )
\ No newline at end of file
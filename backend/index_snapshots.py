@@ -0,0 +1,240 @@
+"""
+Versioned, checksummed index snapshots
+One ingestion node publishes immutable snapshots of ./storage to a shared
+directory; query nodes pull the newest one and hot-swap it in
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import stat
+import threading
+import time
+from datetime import datetime, timezone
+
+logger = logging.getLogger("index-snapshots")
+
+MANIFEST_FILE = "manifest.json"
+LATEST_FILE = "LATEST"
+# Never copied: SQLite sidecar files (the database is copied with the backup API)
+_SKIP_SUFFIXES = ("-wal", "-shm", "-journal")
+
+
+def _sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _copy_sqlite(src: str, dst: str) -> None:
+    """Consistent copy of a live SQLite database, converted to a rollback journal"""
+    source = sqlite3.connect(src)
+    target = sqlite3.connect(dst)
+    try:
+        source.backup(target)
+        target.execute("PRAGMA journal_mode=DELETE")
+    finally:
+        target.close()
+        source.close()
+
+
+def is_snapshot(path: str) -> bool:
+    return os.path.exists(os.path.join(path, MANIFEST_FILE))
+
+
+def publish_snapshot(persist_dir: str, snapshot_dir: str, config=None, keep: int = 3) -> str:
+    """
+    Copy an index directory into a new immutable snapshot
+
+    Args:
+        persist_dir: Index directory to publish
+        snapshot_dir: Shared snapshot directory
+        config: Extra settings recorded in the manifest (e.g. quantization)
+        keep: Number of snapshots to keep (older ones are pruned)
+
+    Returns:
+        str: The new snapshot version
+    """
+    os.makedirs(snapshot_dir, exist_ok=True)
+    created_at = datetime.now(timezone.utc)
+    staging = os.path.join(snapshot_dir, f".staging-{os.getpid()}-{created_at:%Y%m%dT%H%M%S%f}")
+    os.makedirs(staging)
+
+    try:
+        files = {}
+        for name in sorted(os.listdir(persist_dir)):
+            src = os.path.join(persist_dir, name)
+            if not os.path.isfile(src) or name.endswith(_SKIP_SUFFIXES):
+                continue
+            dst = os.path.join(staging, name)
+            if name.endswith(".sqlite3"):
+                _copy_sqlite(src, dst)
+            else:
+                shutil.copy2(src, dst)
+            files[name] = {"sha256": _sha256(dst), "size": os.path.getsize(dst)}
+
+        content_hash = hashlib.sha256(
+            "".join(f"{name}:{info['sha256']}" for name, info in files.items()).encode()
+        ).hexdigest()
+        version = f"v{created_at:%Y%m%dT%H%M%S%f}Z-{content_hash[:8]}"
+
+        manifest = {
+            "version": version,
+            "created_at": created_at.isoformat(),
+            "content_hash": content_hash,
+            "files": files,
+            "config": config or {},
+        }
+        with open(os.path.join(staging, MANIFEST_FILE), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2)
+
+        # Snapshots are immutable once published
+        for name in os.listdir(staging):
+            os.chmod(os.path.join(staging, name), stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+
+        os.rename(staging, os.path.join(snapshot_dir, version))
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    # Point LATEST at the new version atomically
+    pointer_tmp = os.path.join(snapshot_dir, f".{LATEST_FILE}.{os.getpid()}")
+    with open(pointer_tmp, "w", encoding="utf-8") as f:
+        f.write(version)
+    os.replace(pointer_tmp, os.path.join(snapshot_dir, LATEST_FILE))
+
+    logger.info(f"Published index snapshot {version} ({len(files)} files)")
+    prune_snapshots(snapshot_dir, keep=keep)
+    return version
+
+
+def list_snapshots(snapshot_dir: str):
+    """Published snapshot versions, oldest first"""
+    if not os.path.isdir(snapshot_dir):
+        return []
+    return sorted(
+        name for name in os.listdir(snapshot_dir)
+        if name.startswith("v") and is_snapshot(os.path.join(snapshot_dir, name))
+    )
+
+
+def latest_version(snapshot_dir: str):
+    """Version named by LATEST, or the newest published snapshot"""
+    try:
+        with open(os.path.join(snapshot_dir, LATEST_FILE), "r", encoding="utf-8") as f:
+            version = f.read().strip()
+        if is_snapshot(os.path.join(snapshot_dir, version)):
+            return version
+    except FileNotFoundError:
+        pass
+    versions = list_snapshots(snapshot_dir)
+    return versions[-1] if versions else None
+
+
+def read_manifest(path: str) -> dict:
+    with open(os.path.join(path, MANIFEST_FILE), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def verify_snapshot(path: str) -> bool:
+    """Check every file against the manifest checksums"""
+    manifest = read_manifest(path)
+    for name, info in manifest["files"].items():
+        file_path = os.path.join(path, name)
+        if not os.path.isfile(file_path) or _sha256(file_path) != info["sha256"]:
+            logger.error(f"Snapshot {manifest['version']}: checksum mismatch for {name}")
+            return False
+    return True
+
+
+def prune_snapshots(snapshot_dir: str, keep: int = 3) -> None:
+    """
+    Remove all but the newest `keep` snapshots
+
+    Query nodes still serving a pruned snapshot keep working: open files and
+    memory maps survive the unlink, and they swap to a newer one on their next poll.
+    """
+    latest = latest_version(snapshot_dir)
+    for version in list_snapshots(snapshot_dir)[:-keep or None]:
+        if version == latest:
+            continue
+        path = os.path.join(snapshot_dir, version)
+        for name in os.listdir(path):
+            os.chmod(os.path.join(path, name), stat.S_IRUSR | stat.S_IWUSR)
+        shutil.rmtree(path, ignore_errors=True)
+        logger.info(f"Pruned index snapshot {version}")
+
+
+class SnapshotLoader:
+    """
+    Serves the newest snapshot and hot-swaps it when a new one is published
+
+    In-flight queries keep the handle they started with; a swap only replaces
+    the reference that new queries pick up. Newer snapshots are picked up by
+    calling refresh() off the serving loop (e.g. every poll_interval from a
+    worker thread); current() never verifies or loads one inline.
+
+    Args:
+        snapshot_dir: Shared snapshot directory
+        load_fn: Callable(path) -> handle used to serve queries
+        poll_interval: Seconds between checks for a newer snapshot
+    """
+
+    def __init__(self, snapshot_dir: str, load_fn, poll_interval: float = 30.0) -> None:
+        self.snapshot_dir = snapshot_dir
+        self.load_fn = load_fn
+        self.poll_interval = poll_interval
+        self.version = None
+        self.handle = None
+        self._rejected = set()
+        self._lock = threading.Lock()
+
+    def refresh(self, blocking: bool = True) -> bool:
+        """
+        Load the newest snapshot if it differs from the one being served
+
+        Args:
+            blocking: If False, return immediately when another refresh is running
+
+        Returns:
+            bool: True if a new snapshot was swapped in
+        """
+        if not self._lock.acquire(blocking=blocking):
+            return False
+        try:
+            version = latest_version(self.snapshot_dir)
+            if version is None or version == self.version or version in self._rejected:
+                return False
+
+            path = os.path.join(self.snapshot_dir, version)
+            start = time.perf_counter()
+            if not verify_snapshot(path):
+                self._rejected.add(version)
+                return False
+            try:
+                handle = self.load_fn(path)
+            except Exception as e:
+                logger.error(f"Failed to load index snapshot {version}: {e}")
+                self._rejected.add(version)
+                return False
+
+            previous = self.version
+            self.handle, self.version = handle, version
+            logger.info(
+                f"Serving index snapshot {version} (was {previous}), "
+                f"loaded in {(time.perf_counter() - start) * 1000:.0f} ms"
+            )
+            return True
+        finally:
+            self._lock.release()
+
+    def current(self):
+        """Handle for a new query; only blocks until the first snapshot is loaded"""
+        if self.handle is None:
+            self.refresh()
+        return self.handle
@@ -0,0 +1,280 @@
+"""
+Load-aware admission control for the agent worker
+Job processes publish their event-loop lag and in-flight RAG queries; the
+worker combines them with active sessions and CPU into the load it advertises,
+rejects or defers new jobs past the limits, and tells sessions when to shed
+RAG synthesis
+"""
+
+import asyncio
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+from livekit.agents import JobRequest
+from livekit.agents.utils import hw
+
+logger = logging.getLogger("load-control")
+
+# Shared by the worker and its job processes (children inherit the environment)
+LOAD_DIR = os.environ.setdefault(
+    "AGENT_LOAD_DIR",
+    os.path.join(tempfile.gettempdir(), f"voice-agent-load-{os.getpid()}"),
+)
+WORKER_FILE = "worker.json"
+STATS_INTERVAL = 0.5
+# Stats older than this come from a blocked job (or one that exited uncleanly)
+STALE_SECONDS = 5.0
+
+
+def _write_json(path: str, data: dict) -> None:
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+def _job_alive(pid: int, thread_id) -> bool:
+    """True while the job's process (and thread, for jobs in this process) is running"""
+    if pid == os.getpid():
+        return thread_id is None or any(t.ident == thread_id for t in threading.enumerate())
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # Exists, owned by another user
+    return True
+
+
+def _read_json(path: str):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+@dataclass
+class LoadLimits:
+    """
+    Worker capacity limits; a metric at its limit counts as full (pressure 1.0)
+
+    Args:
+        max_sessions: Concurrent sessions per worker
+        max_loop_lag_ms: Event-loop lag of the slowest job
+        max_rag_inflight: RAG queries running across all jobs
+        max_cpu: CPU usage (0-1)
+        load_threshold: Load advertised at pressure 1.0 (LiveKit stops dispatching here)
+        shed_rag_pressure: Pressure at which sessions answer from retrieval only
+        admission_wait: Seconds a job request may wait for pressure to drop before rejection
+    """
+    max_sessions: int = 8
+    max_loop_lag_ms: float = 150.0
+    max_rag_inflight: int = 4
+    max_cpu: float = 0.8
+    load_threshold: float = 0.7
+    shed_rag_pressure: float = 0.85
+    admission_wait: float = 2.0
+
+    @classmethod
+    def from_env(cls) -> "LoadLimits":
+        defaults = cls()
+        return cls(
+            max_sessions=int(os.getenv("AGENT_MAX_SESSIONS", defaults.max_sessions)),
+            max_loop_lag_ms=float(os.getenv("AGENT_MAX_LOOP_LAG_MS", defaults.max_loop_lag_ms)),
+            max_rag_inflight=int(os.getenv("AGENT_MAX_RAG_INFLIGHT", defaults.max_rag_inflight)),
+            max_cpu=float(os.getenv("AGENT_MAX_CPU", defaults.max_cpu)),
+            load_threshold=float(os.getenv("AGENT_LOAD_THRESHOLD", defaults.load_threshold)),
+            shed_rag_pressure=float(os.getenv("AGENT_SHED_RAG_PRESSURE", defaults.shed_rag_pressure)),
+            admission_wait=float(os.getenv("AGENT_ADMISSION_WAIT", defaults.admission_wait)),
+        )
+
+
+class JobLoadMonitor:
+    """
+    Runs inside a job: measures event-loop lag, counts in-flight RAG queries
+    and publishes both for the worker's load function
+
+    Usage:
+        monitor = JobLoadMonitor(limits)
+        await monitor.start()
+        with monitor.track_rag_query():
+            query_docs(query, retrieval_only=monitor.should_shed_rag())
+    """
+
+    def __init__(self, limits: LoadLimits) -> None:
+        self.limits = limits
+        self.loop_lag_ms = 0.0
+        self.rag_inflight = 0
+        self._task = None
+        self._path = os.path.join(LOAD_DIR, f"job-{os.getpid()}-{id(self)}.json")
+
+    async def start(self) -> None:
+        os.makedirs(LOAD_DIR, exist_ok=True)
+        self._publish()
+        self._task = asyncio.create_task(self._measure_lag())
+
+    async def _measure_lag(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            start = loop.time()
+            await asyncio.sleep(STATS_INTERVAL)
+            lag_ms = max((loop.time() - start - STATS_INTERVAL) * 1000, 0.0)
+            # Smooth single hiccups, react within a couple of intervals
+            self.loop_lag_ms = 0.5 * self.loop_lag_ms + 0.5 * lag_ms
+            self._publish()
+
+    def _publish(self) -> None:
+        try:
+            _write_json(self._path, {
+                "pid": os.getpid(),
+                "thread": threading.get_ident(),
+                "loop_lag_ms": round(self.loop_lag_ms, 1),
+                "rag_inflight": self.rag_inflight,
+                "updated_at": time.time(),
+            })
+        except OSError as e:
+            logger.debug(f"Could not publish job load: {e}")
+
+    @contextmanager
+    def track_rag_query(self):
+        self.rag_inflight += 1
+        self._publish()
+        try:
+            yield
+        finally:
+            self.rag_inflight -= 1
+            self._publish()
+
+    def pressure(self) -> float:
+        """Worker-wide pressure, at least this job's own lag"""
+        local = self.loop_lag_ms / self.limits.max_loop_lag_ms
+        worker = _read_json(os.path.join(LOAD_DIR, WORKER_FILE))
+        if worker and time.time() - worker.get("updated_at", 0) < STALE_SECONDS:
+            return max(local, worker.get("pressure", 0.0))
+        return local
+
+    def should_shed_rag(self) -> bool:
+        """True when RAG synthesis should be skipped (answer from retrieved text only)"""
+        return self.pressure() >= self.limits.shed_rag_pressure
+
+    async def aclose(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+        try:
+            os.remove(self._path)
+        except FileNotFoundError:
+            pass
+
+
+class WorkerLoad:
+    """
+    Runs in the worker process: provides load_fnc and request_fnc for WorkerOptions
+
+    Usage:
+        worker_load = WorkerLoad(LoadLimits.from_env())
+        WorkerOptions(
+            entrypoint_fnc=entrypoint,
+            load_fnc=worker_load.compute_load,
+            load_threshold=worker_load.limits.load_threshold,
+            request_fnc=worker_load.request_fnc,
+        )
+    """
+
+    def __init__(self, limits: LoadLimits) -> None:
+        self.limits = limits
+        self.pressure = 0.0
+        self.components = {}
+        self._cpu = 0.0
+        self._accepted_since_update = 0
+        self._sampler = None
+
+    def _sample_cpu(self) -> None:
+        monitor = hw.get_cpu_monitor()
+        while True:
+            cpu = monitor.cpu_percent(interval=STATS_INTERVAL)
+            self._cpu = 0.5 * self._cpu + 0.5 * cpu
+
+    def _job_stats(self):
+        stats = []
+        now = time.time()
+        try:
+            names = os.listdir(LOAD_DIR)
+        except FileNotFoundError:
+            return stats
+        for name in names:
+            if not name.startswith("job-") or not name.endswith(".json"):
+                continue
+            path = os.path.join(LOAD_DIR, name)
+            data = _read_json(path)
+            if data is None:
+                continue
+            silent_ms = (now - data.get("updated_at", 0)) * 1000
+            if silent_ms > STALE_SECONDS * 1000:
+                if not _job_alive(data.get("pid", 0), data.get("thread")):
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+                    continue
+                # A live job that stopped publishing has its loop blocked at least that long
+                data["loop_lag_ms"] = max(data.get("loop_lag_ms", 0.0), silent_ms)
+            stats.append(data)
+        return stats
+
+    def compute_load(self, worker) -> float:
+        """load_fnc: 0-1 load, reaching load_threshold when any metric hits its limit"""
+        if self._sampler is None:
+            os.makedirs(LOAD_DIR, exist_ok=True)
+            self._sampler = threading.Thread(target=self._sample_cpu, daemon=True, name="agent_cpu_sampler")
+            self._sampler.start()
+
+        jobs = self._job_stats()
+        # Jobs accepted since the last update are not in active_jobs yet
+        sessions = len(worker.active_jobs) + self._accepted_since_update
+        self._accepted_since_update = 0
+
+        self.components = {
+            "sessions": sessions,
+            "loop_lag_ms": max((j["loop_lag_ms"] for j in jobs), default=0.0),
+            "rag_inflight": sum(j["rag_inflight"] for j in jobs),
+            "cpu": round(self._cpu, 3),
+        }
+        ratios = {
+            "sessions": sessions / self.limits.max_sessions,
+            "loop_lag_ms": self.components["loop_lag_ms"] / self.limits.max_loop_lag_ms,
+            "rag_inflight": self.components["rag_inflight"] / self.limits.max_rag_inflight,
+            "cpu": self._cpu / self.limits.max_cpu,
+        }
+        self.pressure = max(ratios.values())
+
+        try:
+            _write_json(os.path.join(LOAD_DIR, WORKER_FILE), {
+                "pressure": round(self.pressure, 3),
+                "components": self.components,
+                "updated_at": time.time(),
+            })
+        except OSError as e:
+            logger.debug(f"Could not publish worker load: {e}")
+
+        return min(self.pressure * self.limits.load_threshold, 1.0)
+
+    async def request_fnc(self, req: JobRequest) -> None:
+        """Accept the job, deferring briefly and then rejecting while over capacity"""
+        deadline = time.monotonic() + self.limits.admission_wait
+        while self.pressure >= 1.0 and time.monotonic() < deadline:
+            await asyncio.sleep(STATS_INTERVAL)
+
+        if self.pressure >= 1.0:
+            logger.warning(f"Rejecting job {req.id}: worker over capacity {self.components}")
+            await req.reject()
+            return
+
+        self._accepted_since_update += 1
+        await req.accept()
@@ -0,0 +1,251 @@
+"""
+Quantized vector index (int8 / 1-bit) with exact rescoring
+Candidate search runs on compact in-memory codes; only the top candidates
+are rescored with full-precision vectors memory-mapped from disk.
+The "float" mode skips the codes and scores the memory-mapped vectors
+exactly, so loading it does not read the vectors either
+"""
+
+import json
+import os
+import uuid
+
+import numpy as np
+
+QUANT_FILE = "quantized_vectors.npz"
+# Full-precision vectors are written per build (full_vectors-<build>.npy) and
+# named in QUANT_FILE, so replacing QUANT_FILE swaps both atomically
+FULL_FILE = "full_vectors.npy"
+FULL_PREFIX = "full_vectors"
+QUANT_MODES = ("int8", "binary")
+# Modes QUANT_FILE can hold: exact search over the float vectors, or quantized
+INDEX_MODES = ("float",) + QUANT_MODES
+
+# Number of set bits for every byte value (Hamming distance on packed codes)
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint16)
+
+# Rows scored per block, bounds the temporary float buffer during int8 and float search
+_BLOCK_ROWS = 4096
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _as_id_array(node_ids) -> np.ndarray:
+    """Node ids as a fixed-width utf-8 bytes array (no per-id Python objects)"""
+    node_ids = np.asarray(node_ids)
+    if node_ids.dtype.kind == "S":
+        return node_ids
+    return np.asarray([str(n).encode("utf-8") for n in node_ids.tolist()], dtype=bytes)
+
+
+def _id_order(node_ids: np.ndarray) -> np.ndarray:
+    return np.argsort(node_ids).astype(np.int32)
+
+
+def load_embedding_dict(persist_dir: str) -> dict:
+    """Read node_id -> embedding from a persisted SimpleVectorStore"""
+    with open(os.path.join(persist_dir, "default__vector_store.json"), "r", encoding="utf-8") as f:
+        return json.load(f)["embedding_dict"]
+
+
+class QuantizedVectorIndex:
+    """
+    Cosine-similarity index over quantized embeddings
+
+    Args:
+        node_ids: Node id for every row (utf-8 bytes array, or strings)
+        codes: int8 codes (n, dim) or packed sign bits (n, dim / 8)
+        scales: Per-row dequantization scale (int8 only)
+        mode: "float", "int8" or "binary"
+        full_vectors: Normalized float32 vectors, usually a read-only memmap
+        order: Rows sorted by node id (computed if not given)
+    """
+
+    def __init__(self, node_ids, codes, scales, mode, full_vectors, order=None) -> None:
+        if mode not in INDEX_MODES:
+            raise ValueError(f"Unknown quantization mode: {mode} (expected one of {INDEX_MODES})")
+        self.node_ids = _as_id_array(node_ids)
+        self.codes = codes
+        self.scales = scales
+        self.mode = mode
+        self.full_vectors = full_vectors
+        # Row lookup by binary search (a dict costs ~200 bytes per id)
+        self._order = _id_order(self.node_ids) if order is None else order
+
+    @classmethod
+    def build(cls, embedding_dict: dict, persist_dir: str, mode: str = "int8") -> "QuantizedVectorIndex":
+        """
+        Quantize embeddings and persist codes + full-precision vectors
+
+        Args:
+            embedding_dict: node_id -> embedding (as stored by SimpleVectorStore)
+            persist_dir: Directory to write the index files to
+            mode: "float", "int8" or "binary"
+
+        Returns:
+            QuantizedVectorIndex: The index, loaded back from disk
+        """
+        if mode not in INDEX_MODES:
+            raise ValueError(f"Unknown quantization mode: {mode} (expected one of {INDEX_MODES})")
+
+        node_ids = list(embedding_dict.keys())
+        vectors = normalize(np.asarray([embedding_dict[n] for n in node_ids], dtype=np.float32))
+
+        if mode == "int8":
+            scales = np.abs(vectors).max(axis=1) / 127.0
+            scales[scales == 0] = 1.0
+            codes = np.round(vectors / scales[:, None]).astype(np.int8)
+            scales = scales.astype(np.float32)
+        elif mode == "binary":
+            codes = np.packbits(vectors > 0, axis=1)
+            scales = np.ones(len(node_ids), dtype=np.float32)
+        else:
+            codes = np.empty((len(node_ids), 0), dtype=np.int8)
+            scales = np.empty(0, dtype=np.float32)
+        id_array = _as_id_array(node_ids)
+
+        os.makedirs(persist_dir, exist_ok=True)
+        # Readers may have the previous files memory-mapped: never rewrite them
+        # in place. New vectors go to a new file, then QUANT_FILE is replaced last.
+        full_file = f"{FULL_PREFIX}-{uuid.uuid4().hex[:12]}.npy"
+        tmp_quant = os.path.join(persist_dir, f".{QUANT_FILE}.{os.getpid()}.tmp")
+        with open(os.path.join(persist_dir, full_file), "wb") as f:
+            np.save(f, vectors)
+        with open(tmp_quant, "wb") as f:
+            np.savez(
+                f,
+                node_ids=id_array,
+                order=_id_order(id_array),
+                codes=codes,
+                scales=scales,
+                mode=np.asarray(mode),
+                full_file=np.asarray(full_file),
+            )
+        os.replace(tmp_quant, os.path.join(persist_dir, QUANT_FILE))
+
+        # Open memory maps survive the unlink of superseded vector files
+        for name in os.listdir(persist_dir):
+            if name != full_file and (name == FULL_FILE or name.startswith(f"{FULL_PREFIX}-")):
+                os.remove(os.path.join(persist_dir, name))
+        return cls.load(persist_dir)
+
+    @classmethod
+    def load(cls, persist_dir: str) -> "QuantizedVectorIndex":
+        """Load codes into memory and memory-map the full-precision vectors"""
+        with np.load(os.path.join(persist_dir, QUANT_FILE)) as data:
+            node_ids = data["node_ids"]
+            order = data["order"] if "order" in data else None
+            codes = data["codes"]
+            scales = data["scales"]
+            mode = str(data["mode"])
+            full_file = str(data["full_file"]) if "full_file" in data else FULL_FILE
+        # Open the vectors named by this QUANT_FILE, never a newer build's
+        full_vectors = np.load(os.path.join(persist_dir, full_file), mmap_mode="r")
+        if full_vectors.shape[0] != len(node_ids):
+            raise ValueError(f"{full_file} has {full_vectors.shape[0]} rows, expected {len(node_ids)}")
+        return cls(node_ids, codes, scales, mode, full_vectors, order=order)
+
+    @staticmethod
+    def exists(persist_dir: str) -> bool:
+        return os.path.exists(os.path.join(persist_dir, QUANT_FILE))
+
+    @staticmethod
+    def stored_mode(persist_dir: str):
+        """Mode of the persisted index without loading it, None if there is none"""
+        if not QuantizedVectorIndex.exists(persist_dir):
+            return None
+        with np.load(os.path.join(persist_dir, QUANT_FILE)) as data:
+            return str(data["mode"])
+
+    @property
+    def resident_bytes(self) -> int:
+        """Memory held in RAM: codes, scales, node ids and the row lookup"""
+        return self.codes.nbytes + self.scales.nbytes + self.node_ids.nbytes + self._order.nbytes
+
+    def _lookup_rows(self, node_ids) -> np.ndarray:
+        """Rows of the given node ids (unknown ids are skipped), ascending"""
+        wanted = _as_id_array(list(node_ids))
+        if wanted.size == 0:
+            return np.empty(0, dtype=np.int64)
+        pos = np.searchsorted(self.node_ids, wanted, sorter=self._order)
+        pos = np.minimum(pos, len(self._order) - 1)
+        rows = self._order[pos]
+        # Ids longer than the stored width would be truncated, compare exactly
+        rows = rows[self.node_ids[rows] == wanted]
+        return np.unique(rows).astype(np.int64)
+
+    def _approx_scores(self, query: np.ndarray, rows=None) -> np.ndarray:
+        if self.mode == "float":
+            return self._exact_scores(query, rows)
+
+        codes = self.codes if rows is None else self.codes[rows]
+        scales = self.scales if rows is None else self.scales[rows]
+
+        if self.mode == "binary":
+            query_bits = np.packbits(query > 0)
+            distances = _POPCOUNT[np.bitwise_xor(codes, query_bits)].sum(axis=1)
+            return -distances.astype(np.float32)
+
+        scores = np.empty(len(codes), dtype=np.float32)
+        for start in range(0, len(codes), _BLOCK_ROWS):
+            block = codes[start:start + _BLOCK_ROWS].astype(np.float32)
+            scores[start:start + _BLOCK_ROWS] = (block @ query) * scales[start:start + _BLOCK_ROWS]
+        return scores
+
+    def _exact_scores(self, query: np.ndarray, rows=None) -> np.ndarray:
+        """Scores from the memory-mapped vectors, read block by block"""
+        n_rows = len(self.node_ids) if rows is None else len(rows)
+        scores = np.empty(n_rows, dtype=np.float32)
+        for start in range(0, n_rows, _BLOCK_ROWS):
+            if rows is None:
+                block = self.full_vectors[start:start + _BLOCK_ROWS]
+            else:
+                block = self.full_vectors[rows[start:start + _BLOCK_ROWS]]
+            scores[start:start + _BLOCK_ROWS] = np.asarray(block) @ query
+        return scores
+
+    def search(self, query_embedding, top_k: int = 2, rescore_multiplier: int = 8, node_ids=None):
+        """
+        Find the top_k most similar nodes
+
+        Args:
+            query_embedding: Query vector (any norm)
+            top_k: Number of results
+            rescore_multiplier: Candidates rescored exactly = top_k * rescore_multiplier
+            node_ids: Optional node ids to restrict the search to (metadata prefilter)
+
+        Returns:
+            list[tuple[str, float]]: (node_id, cosine similarity), best first
+        """
+        if not len(self.node_ids) or top_k <= 0:
+            return []
+
+        if node_ids is not None:
+            rows = self._lookup_rows(node_ids)
+            if rows.size == 0:
+                return []
+        else:
+            rows = None
+
+        query = normalize(np.asarray(query_embedding, dtype=np.float32))
+        approx = self._approx_scores(query, rows)
+
+        n_rows = len(approx)
+        # Float scores are already exact, no rescoring pass
+        n_candidates = min(n_rows, top_k if self.mode == "float" else top_k * rescore_multiplier)
+        if n_candidates < n_rows:
+            candidates = np.argpartition(-approx, n_candidates - 1)[:n_candidates]
+        else:
+            candidates = np.arange(n_rows)
+        if rows is not None:
+            candidates = rows[candidates]
+        candidates = np.sort(candidates)
+
+        # Exact rescoring reads only the candidate rows from disk
+        exact = np.asarray(self.full_vectors[candidates]) @ query
+        order = np.argsort(-exact)[:top_k]
+        return [(self.node_ids[candidates[i]].decode("utf-8"), float(exact[i])) for i in order]
@@ -4,6 +4,7 @@ Lightweight - uses API for embeddings (no local model)
 """
 
 import os
+import threading
 from dotenv import load_dotenv
 from llama_index.core import (
     VectorStoreIndex,
@@ -12,8 +13,23 @@ from llama_index.core import (
     load_index_from_storage,
     Settings,
 )
+from llama_index.core.readers.file.base import default_file_metadata_func
+from llama_index.core.query_engine import RetrieverQueryEngine
+from llama_index.core.retrievers import BaseRetriever, VectorIndexRetriever
+from llama_index.core.schema import MetadataMode, NodeWithScore
+from llama_index.core.storage.docstore import SimpleDocumentStore
+from llama_index.core.storage.docstore.keyval_docstore import KVDocumentStore
+from llama_index.core.storage.index_store.keyval_index_store import (
+    DEFAULT_COLLECTION_SUFFIX,
+    DEFAULT_NAMESPACE,
+    KVIndexStore,
+)
 from llama_index.embeddings.gemini import GeminiEmbedding
 from llama_index.llms.gemini import Gemini
+from attribute_index import AttributeIndex
+from index_snapshots import SnapshotLoader, is_snapshot, publish_snapshot, read_manifest
+from quantized_index import QUANT_FILE, QUANT_MODES, QuantizedVectorIndex, load_embedding_dict
+from sqlite_kvstore import SQLiteKVStore
 
 load_dotenv()
 
@@ -21,8 +37,25 @@ load_dotenv()
 PERSIST_DIR = "./storage"
 DOCS_DIR = "./documents"
 GEMINI_API_KEY = os.getenv("GOOGLE_API_KEY")
-
-# Initialize Gemini models
+# "none" (default), "int8" or "binary"
+QUANTIZATION = os.getenv("RAG_QUANTIZATION", "none").lower()
+SIMILARITY_TOP_K = 2
+# "json" (default, SimpleDocumentStore files) or "sqlite" (lazy node loading, incremental writes)
+DOCSTORE_BACKEND = os.getenv("RAG_DOCSTORE", "json").lower()
+DOCSTORE_DB = "docstore.sqlite3"
+VECTOR_STORE_FILE = "default__vector_store.json"
+# Shared snapshot directory; build_index publishes here and query nodes load from here
+SNAPSHOT_DIR = os.getenv("RAG_SNAPSHOT_DIR")
+SNAPSHOT_POLL_SECONDS = float(os.getenv("RAG_SNAPSHOT_POLL_SECONDS", "30"))
+# Product names tagged on chunks for filtered retrieval (comma separated)
+PRODUCT_TAGS = [
+    p.strip() for p in os.getenv("RAG_PRODUCT_TAGS", "CloudSync Pro,DataGuard,TeamConnect").split(",") if p.strip()
+]
+# Filter metadata is for retrieval only, keep it out of embeddings and prompts
+FILTER_METADATA_KEYS = ["source", "doc_type", "uploaded_at", "products"]
+
+# Initialize Gemini models (one set per process; the agents run their jobs as
+# threads of one process, so every session shares these clients)
 gemini_embedding = GeminiEmbedding(
     api_key=GEMINI_API_KEY,
     model_name="models/text-embedding-004"
@@ -38,6 +71,127 @@ Settings.llm = gemini_llm
 Settings.embed_model = gemini_embedding
 
 
+def file_metadata(file_path):
+    """Default file metadata plus source, type and upload time for filtering"""
+    metadata = default_file_metadata_func(file_path)
+    metadata["source"] = os.path.basename(file_path)
+    metadata["doc_type"] = os.path.splitext(file_path)[1].lstrip(".").lower()
+    metadata["uploaded_at"] = os.path.getmtime(file_path)
+    return metadata
+
+
+def tag_nodes(nodes):
+    """Tag each chunk with the products it mentions"""
+    for node in nodes:
+        text = node.get_content().lower()
+        node.metadata["products"] = ",".join(p for p in PRODUCT_TAGS if p.lower() in text)
+        node.excluded_embed_metadata_keys.extend(FILTER_METADATA_KEYS)
+        node.excluded_llm_metadata_keys.extend(FILTER_METADATA_KEYS)
+    return nodes
+
+
+# One SQLite connection per database file
+_kvstores = {}
+
+
+def vector_mode(quantization=None, docstore_backend=None):
+    """
+    Mode of the vector file queries are served from, None for the llama-index float path
+    
+    The sqlite backend serves float vectors through the same lazy path as
+    quantization (memory-mapped vectors, node text per id), so loading it
+    reads neither the JSON vector store nor the index struct.
+    """
+    quantization = quantization or QUANTIZATION
+    if quantization in QUANT_MODES:
+        return quantization
+    if (docstore_backend or DOCSTORE_BACKEND) == "sqlite":
+        return "float"
+    return None
+
+
+def get_kvstore(persist_dir=PERSIST_DIR):
+    path = os.path.join(persist_dir, DOCSTORE_DB)
+    inode = os.stat(path).st_ino if os.path.exists(path) else None
+    cached = _kvstores.get(path)
+    # A rebuild (possibly by another process) replaces the file; in-flight
+    # queries keep the old connection, new ones open the new file
+    if cached is None or cached[1] != inode:
+        kvstore = SQLiteKVStore(path, read_only=is_snapshot(persist_dir))
+        inode = os.stat(path).st_ino
+        _kvstores[path] = (kvstore, inode)
+    return _kvstores[path][0]
+
+
+def close_kvstore(persist_dir=PERSIST_DIR):
+    cached = _kvstores.pop(os.path.join(persist_dir, DOCSTORE_DB), None)
+    if cached is not None:
+        cached[0].close()
+
+
+def index_exists(persist_dir=PERSIST_DIR):
+    """True only for a complete index (a failed build leaves a partial one behind)"""
+    if not os.path.exists(os.path.join(persist_dir, VECTOR_STORE_FILE)):
+        return False
+    if DOCSTORE_BACKEND != "sqlite":
+        return os.path.exists(os.path.join(persist_dir, "docstore.json"))
+    if not os.path.exists(os.path.join(persist_dir, DOCSTORE_DB)):
+        return False
+    # Checked on every query, so count rows instead of loading the index struct
+    return get_kvstore(persist_dir).count(f"{DEFAULT_NAMESPACE}{DEFAULT_COLLECTION_SUFFIX}") > 0
+
+
+def remove_kvstore(persist_dir=PERSIST_DIR):
+    """Delete the sqlite docstore (and its WAL files) left by a failed build"""
+    close_kvstore(persist_dir)
+    for suffix in ("", "-wal", "-shm"):
+        path = os.path.join(persist_dir, DOCSTORE_DB + suffix)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def get_storage_context(persist_dir=PERSIST_DIR, load=True, backend=None):
+    """
+    Storage context for the configured docstore backend
+    
+    Args:
+        persist_dir: Index directory
+        load: If True, load the persisted vector store from persist_dir
+        backend: "json" or "sqlite" (defaults to RAG_DOCSTORE)
+    
+    Returns:
+        StorageContext: The storage context
+    """
+    if (backend or DOCSTORE_BACKEND) == "sqlite":
+        kvstore = get_kvstore(persist_dir)
+        return StorageContext.from_defaults(
+            docstore=KVDocumentStore(kvstore),
+            index_store=KVIndexStore(kvstore),
+            persist_dir=persist_dir if load else None,
+        )
+    return StorageContext.from_defaults(persist_dir=persist_dir if load else None)
+
+
+def load_docstore(persist_dir=PERSIST_DIR, backend=None):
+    """Docstore only (no vector store), node text is fetched per id with sqlite"""
+    if (backend or DOCSTORE_BACKEND) == "sqlite":
+        return KVDocumentStore(get_kvstore(persist_dir))
+    return SimpleDocumentStore.from_persist_dir(persist_dir)
+
+
+def publish_index():
+    """Publish ./storage as a new immutable snapshot (ingestion node)"""
+    if not SNAPSHOT_DIR:
+        return None
+    version = publish_snapshot(
+        PERSIST_DIR,
+        SNAPSHOT_DIR,
+        config={"quantization": QUANTIZATION, "docstore": DOCSTORE_BACKEND},
+    )
+    print(f"Published index snapshot {version}")
+    return version
+
+
 def build_index(force_rebuild=False):
     """
     Build or load the vector index
@@ -65,23 +219,42 @@ def build_index(force_rebuild=False):
     # Check if we should rebuild
     if force_rebuild and os.path.exists(PERSIST_DIR):
         import shutil
+        close_kvstore(PERSIST_DIR)
         shutil.rmtree(PERSIST_DIR)
+        os.makedirs(PERSIST_DIR, exist_ok=True)
         print("Rebuilding index from scratch...")
     
     # Load or create index
-    if not os.path.exists(os.path.join(PERSIST_DIR, "docstore.json")) or force_rebuild:
+    if not index_exists() or force_rebuild:
         # Load documents and create index
         print("Loading documents...")
         try:
-            documents = SimpleDirectoryReader(DOCS_DIR).load_data()
+            # Start from an empty store, not the remains of a failed build; the
+            # vector store is persisted last and marks the index as complete
+            if DOCSTORE_BACKEND == "sqlite":
+                remove_kvstore()
+            if os.path.exists(os.path.join(PERSIST_DIR, VECTOR_STORE_FILE)):
+                os.remove(os.path.join(PERSIST_DIR, VECTOR_STORE_FILE))
+            
+            documents = SimpleDirectoryReader(DOCS_DIR, file_metadata=file_metadata).load_data()
             print(f"Loaded {len(documents)} documents")
             
+            # Chunk and tag nodes for metadata filtering
+            nodes = tag_nodes(Settings.node_parser.get_nodes_from_documents(documents))
+            
             print("Creating embeddings (using Gemini API)...")
-            index = VectorStoreIndex.from_documents(documents)
+            index = VectorStoreIndex(nodes, storage_context=get_storage_context(load=False))
             
             # Save index
             index.storage_context.persist(persist_dir=PERSIST_DIR)
+            AttributeIndex.from_nodes(nodes).persist(PERSIST_DIR)
             print("Index created and saved")
+            
+            if vector_mode():
+                QuantizedVectorIndex.build(load_embedding_dict(PERSIST_DIR), PERSIST_DIR, mode=vector_mode())
+                print(f"Vector file ({vector_mode()}) saved")
+            
+            publish_index()
         except Exception as e:
             print(f"Error creating index: {e}")
             return None
@@ -89,8 +262,7 @@ def build_index(force_rebuild=False):
         # Load existing index
         try:
             print("Loading existing index...")
-            storage_context = StorageContext.from_defaults(persist_dir=PERSIST_DIR)
-            index = load_index_from_storage(storage_context)
+            index = load_index_from_storage(get_storage_context())
             print("Index loaded")
         except Exception as e:
             print(f"Error loading index: {e}")
@@ -99,12 +271,272 @@ def build_index(force_rebuild=False):
     return index
 
 
-def query_docs(query: str) -> str:
+def add_document(file_path):
+    """
+    Index one new or replaced file
+    
+    With the sqlite docstore the file's nodes are swapped in one transaction;
+    the json docstore falls back to a full rebuild.
+    
+    Args:
+        file_path: Path of the uploaded file
+    
+    Returns:
+        VectorStoreIndex or None: The updated index
+    """
+    if DOCSTORE_BACKEND != "sqlite" or not index_exists():
+        return build_index(force_rebuild=True)
+    
+    # Loads the full float vector store (also with quantization): insert_nodes
+    # and the vector store persist below need the in-memory index
+    index = build_index()
+    if index is None:
+        return None
+    
+    documents = SimpleDirectoryReader(input_files=[file_path], file_metadata=file_metadata).load_data()
+    nodes = tag_nodes(Settings.node_parser.get_nodes_from_documents(documents))
+    
+    # Embed before opening the transaction so the write lock is held briefly
+    print("Creating embeddings (using Gemini API)...")
+    embeddings = Settings.embed_model.get_text_embedding_batch(
+        [node.get_content(metadata_mode=MetadataMode.EMBED) for node in nodes]
+    )
+    for node, embedding in zip(nodes, embeddings):
+        node.embedding = embedding
+    
+    attributes = AttributeIndex.load(PERSIST_DIR) if AttributeIndex.exists(PERSIST_DIR) else AttributeIndex()
+    source = os.path.basename(file_path)
+    with get_kvstore().transaction():
+        # Re-uploads replace the previous version of the file
+        for ref_doc_id, info in (index.docstore.get_all_ref_doc_info() or {}).items():
+            if info.metadata.get("source") == source:
+                attributes.remove(info.node_ids)
+                index.delete_ref_doc(ref_doc_id, delete_from_docstore=True)
+        index.insert_nodes(nodes)
+    
+    # Docstore/index store are already committed, this writes the vector store
+    index.storage_context.persist(persist_dir=PERSIST_DIR)
+    attributes.add_nodes(nodes)
+    attributes.persist(PERSIST_DIR)
+    if vector_mode():
+        QuantizedVectorIndex.build(load_embedding_dict(PERSIST_DIR), PERSIST_DIR, mode=vector_mode())
+    print(f"Indexed {len(nodes)} chunks from {source}")
+    publish_index()
+    
+    return index
+
+
+class QuantizedRetriever(BaseRetriever):
+    """Retriever over a QuantizedVectorIndex, node text comes from the docstore"""
+    
+    def __init__(self, quantized_index, docstore, similarity_top_k=SIMILARITY_TOP_K, node_ids=None):
+        self._quantized_index = quantized_index
+        self._docstore = docstore
+        self._similarity_top_k = similarity_top_k
+        self._node_ids = node_ids
+        super().__init__()
+    
+    def _retrieve(self, query_bundle):
+        query_embedding = Settings.embed_model.get_query_embedding(query_bundle.query_str)
+        hits = self._quantized_index.search(
+            query_embedding, top_k=self._similarity_top_k, node_ids=self._node_ids
+        )
+        return [
+            NodeWithScore(node=self._docstore.get_node(node_id), score=score)
+            for node_id, score in hits
+        ]
+
+
+class IndexHandle:
+    """
+    Everything query_docs needs from one index directory
+    
+    Loaded once and shared by concurrent queries; a new handle replaces it when
+    the index changes (local rebuild or a newer snapshot), while queries that
+    already hold the old one finish on it.
+    
+    Args:
+        persist_dir: Index directory (./storage or a published snapshot)
+        quantization: How the index was built (defaults to RAG_QUANTIZATION)
+        docstore_backend: How the index was built (defaults to RAG_DOCSTORE)
+    """
+    
+    def __init__(self, persist_dir, quantization=None, docstore_backend=None):
+        self.persist_dir = persist_dir
+        self.quantization = quantization or QUANTIZATION
+        self.docstore_backend = docstore_backend or DOCSTORE_BACKEND
+        self.attributes = AttributeIndex.load(persist_dir) if AttributeIndex.exists(persist_dir) else None
+        self.index = None
+        self.quantized_index = None
+        self.docstore = None
+        
+        mode = vector_mode(self.quantization, self.docstore_backend)
+        # Snapshots published before the sqlite float path have no vector file
+        if mode == "float" and not QuantizedVectorIndex.exists(persist_dir):
+            mode = None
+        
+        if mode:
+            # Candidate search without reading the JSON vector store or index struct
+            self.quantized_index = QuantizedVectorIndex.load(persist_dir)
+            self.docstore = load_docstore(persist_dir, backend=self.docstore_backend)
+            print(f"Vector index ({mode}) loaded ({self.quantized_index.resident_bytes / 1024:.1f} KB resident)")
+        else:
+            self.index = load_index_from_storage(
+                get_storage_context(persist_dir, backend=self.docstore_backend)
+            )
+    
+    def filter_node_ids(self, filters):
+        """
+        Prefilter candidate nodes with the attribute posting lists
+        
+        Args:
+            filters: {"source", "doc_type", "product", "uploaded_after"} (all optional)
+        
+        Returns:
+            list or None: Matching node ids, or None to search every node
+        """
+        filters = {k: v for k, v in (filters or {}).items() if v}
+        if not filters:
+            return None
+        
+        if self.attributes is None:
+            print("No attribute index (rebuild the index to enable filters), searching all documents")
+            return None
+        
+        node_ids = self.attributes.candidates(filters)
+        if node_ids is None:
+            # Every filter was unusable (e.g. an unparseable date)
+            return None
+        if not node_ids:
+            # Spoken filter values can be off, don't fail the whole lookup
+            print(f"No documents match filters {filters}, searching all documents")
+            return None
+        
+        print(f"Filters {filters} matched {len(node_ids)} chunks")
+        return sorted(node_ids)
+    
+    def retriever(self, node_ids=None):
+        """Retriever, node_ids restricts similarity scoring to the prefiltered set"""
+        if self.quantized_index is not None:
+            # Quantized candidate search + exact rescoring (or exact float search)
+            return QuantizedRetriever(self.quantized_index, self.docstore, node_ids=node_ids)
+        if node_ids is None:
+            return self.index.as_retriever(similarity_top_k=SIMILARITY_TOP_K)
+        # as_retriever() always passes every node id itself, build the retriever directly
+        return VectorIndexRetriever(
+            self.index,
+            similarity_top_k=SIMILARITY_TOP_K,
+            node_ids=node_ids,
+            callback_manager=self.index._callback_manager,
+        )
+    
+    def query_engine(self, node_ids=None):
+        """Retrieval + LLM synthesis"""
+        return RetrieverQueryEngine.from_args(self.retriever(node_ids=node_ids))
+
+
+def ensure_quantized(persist_dir=PERSIST_DIR):
+    """Write the vector file for an index built without it, or with another mode"""
+    if QuantizedVectorIndex.stored_mode(persist_dir) == vector_mode():
+        return
+    QuantizedVectorIndex.build(load_embedding_dict(persist_dir), persist_dir, mode=vector_mode())
+    print(f"Vector file ({vector_mode()}) saved")
+
+
+# Handle for ./storage, reloaded when the vector store or the vector file change
+_local_cache = {"key": None, "handle": None}
+# Sessions in other job threads may ask for the handle at the same time
+_local_lock = threading.Lock()
+
+
+def _local_index_key():
+    """Identity of the files a local handle is built from"""
+    names = [VECTOR_STORE_FILE]
+    if vector_mode():
+        # add_document saves the vector store before rewriting the vector file
+        names.append(QUANT_FILE)
+    key = []
+    for name in names:
+        path = os.path.join(PERSIST_DIR, name)
+        if os.path.exists(path):
+            stat = os.stat(path)
+            key.append((stat.st_ino, stat.st_mtime_ns))
+        else:
+            key.append(None)
+    return tuple(key)
+
+
+def get_local_handle():
+    """
+    Handle serving ./storage directly (single-node deployment)
+    
+    Returns:
+        IndexHandle or None: The handle, or None if there are no documents
+    """
+    if not index_exists() and build_index() is None:
+        return None
+    
+    with _local_lock:
+        key = _local_index_key()
+        if _local_cache["key"] != key:
+            if vector_mode():
+                ensure_quantized()
+                key = _local_index_key()
+            _local_cache["handle"] = IndexHandle(PERSIST_DIR)
+            _local_cache["key"] = key
+        
+        return _local_cache["handle"]
+
+
+def load_snapshot_handle(path):
+    """
+    Handle for a published snapshot, configured from its manifest
+    
+    The snapshot is read as the ingestion node built it; this node's own
+    RAG_QUANTIZATION / RAG_DOCSTORE only apply to indexes it builds.
+    """
+    config = read_manifest(path).get("config", {})
+    quantization = config.get("quantization", "none")
+    docstore_backend = config.get("docstore", "json")
+    if quantization not in ("none",) + QUANT_MODES or docstore_backend not in ("json", "sqlite"):
+        raise ValueError(
+            f"unsupported snapshot config quantization={quantization!r} docstore={docstore_backend!r}"
+        )
+    if (quantization, docstore_backend) != (QUANTIZATION, DOCSTORE_BACKEND):
+        print(
+            f"Snapshot {os.path.basename(path)} was built with quantization={quantization}, "
+            f"docstore={docstore_backend} (this node: {QUANTIZATION}, {DOCSTORE_BACKEND}); "
+            f"serving it with the snapshot's settings"
+        )
+    return IndexHandle(path, quantization=quantization, docstore_backend=docstore_backend)
+
+
+# Query nodes serve the newest published snapshot when RAG_SNAPSHOT_DIR is set
+snapshot_loader = (
+    SnapshotLoader(SNAPSHOT_DIR, load_snapshot_handle, poll_interval=SNAPSHOT_POLL_SECONDS)
+    if SNAPSHOT_DIR else None
+)
+
+
+def get_serving_handle():
+    """Index handle for a new query (snapshot or ./storage)"""
+    if snapshot_loader is not None:
+        return snapshot_loader.current()
+    return get_local_handle()
+
+
+def query_docs(query: str, source=None, doc_type=None, product=None, uploaded_after=None,
+               retrieval_only=False) -> str:
     """
     Query the document index
     
     Args:
         query: The question to search for
+        source: Only search this file (e.g. "company_info.txt")
+        doc_type: Only search this file type (e.g. "pdf")
+        product: Only search chunks mentioning this product
+        uploaded_after: Only search documents uploaded after this ISO date
+        retrieval_only: Skip LLM synthesis and return the retrieved passages (load shedding)
     
     Returns:
         str: The answer from the documents
@@ -112,11 +544,29 @@ def query_docs(query: str) -> str:
     print(f"Querying: {query}")
     
     try:
-        # Build/load index
-        index = build_index()
+        # Hold one handle for the whole query, a hot-swap won't affect it
+        handle = get_serving_handle()
+        if handle is None:
+            return "No documents have been indexed yet."
+        
+        node_ids = handle.filter_node_ids({
+            "source": source,
+            "doc_type": doc_type,
+            "product": product,
+            "uploaded_after": uploaded_after,
+        })
+        
+        if retrieval_only:
+            # Under load: let the voice model answer from the raw passages
+            nodes = handle.retriever(node_ids=node_ids).retrieve(query)
+            response_text = "\n\n".join(n.node.get_content() for n in nodes)
+            if not response_text:
+                response_text = "No relevant information found in the documents."
+            print(f"RAG passages (synthesis skipped): {response_text[:100]}...")
+            return response_text
         
         # Create query engine
-        query_engine = index.as_query_engine()
+        query_engine = handle.query_engine(node_ids=node_ids)
         
         # Query
         response = query_engine.query(query)
@@ -1,15 +1,21 @@
 
 import logging
 import os
+import time
 from dotenv import load_dotenv
 from livekit.agents import (
     Agent,
     AgentSession, 
     JobContext,
+    JobExecutorType,
+    JobProcess,
     WorkerOptions,
     cli,
 )
 from livekit.plugins import google
+from client_pool import pool
+from load_control import JobLoadMonitor, LoadLimits, WorkerLoad
+from context_manager import ContextBudget, RealtimeContextMonitor, realtime_compression
 
 # Load environment
 load_dotenv()
@@ -18,6 +24,23 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("gemini-live-agent")
 
+# Worker capacity limits (AGENT_MAX_SESSIONS, AGENT_MAX_LOOP_LAG_MS, ... in .env)
+load_limits = LoadLimits.from_env()
+
+# Gemini Live keeps the session context on the server; it slides the window
+# itself once a long call reaches max_tokens
+context_budget = ContextBudget(max_tokens=16000, target_tokens=8000)
+
+
+def create_realtime_model():
+    """Gemini Live RealtimeModel (options only, each session opens its own connection)"""
+    return google.realtime.RealtimeModel(
+        model="gemini-2.5-flash-native-audio-preview-12-2025",
+        voice="Puck",  # Options: Puck, Charon, Kore, Fenrir, Aoede
+        temperature=0.8,
+        context_window_compression=realtime_compression(context_budget),
+    )
+
 
 class GeminiLiveAssistant(Agent):
     """Voice Assistant using Gemini Live API (native audio)"""
@@ -31,11 +54,7 @@ class GeminiLiveAssistant(Agent):
         
         # Use Gemini Live API RealtimeModel
         # This handles STT + LLM + TTS all in one!
-        realtime_model = google.realtime.RealtimeModel(
-            model="gemini-2.5-flash-native-audio-preview-12-2025",
-            voice="Puck",  # Options: Puck, Charon, Kore, Fenrir, Aoede
-            temperature=0.8,
-        )
+        realtime_model = pool.get("gemini_realtime", create_realtime_model)
         
         super().__init__(
             instructions=instructions,
@@ -43,10 +62,22 @@ class GeminiLiveAssistant(Agent):
         )
 
 
+def prewarm(proc: JobProcess):
+    """Create the realtime model before the first job arrives"""
+    pool.get("gemini_realtime", create_realtime_model)
+
+
 async def entrypoint(ctx: JobContext):
     """Main entry point for the agent"""
     
+    job_started = time.time()
     logger.info(f"Connecting to room: {ctx.room.name}")
+    ctx.add_shutdown_callback(pool.aclose)
+    
+    # Report this job's event-loop lag / RAG load to the worker
+    load_monitor = JobLoadMonitor(load_limits)
+    await load_monitor.start()
+    ctx.add_shutdown_callback(load_monitor.aclose)
     
     # Connect to the room
     await ctx.connect()
@@ -55,6 +86,10 @@ async def entrypoint(ctx: JobContext):
     # Create agent session with Gemini Live
     session = AgentSession()
     
+    # Per-turn prompt size, as reported by the model
+    context_monitor = RealtimeContextMonitor(context_budget, name="gemini-live")
+    session.on("metrics_collected", context_monitor.on_metrics_collected)
+    
     # Start the session
     await session.start(
         room=ctx.room,
@@ -62,6 +97,7 @@ async def entrypoint(ctx: JobContext):
     )
     
     logger.info("Gemini Live voice assistant ready!")
+    logger.info(f"Client pool (this worker process): {pool.stats(since=job_started)}")
 
 
 if __name__ == "__main__":
@@ -102,8 +138,15 @@ if __name__ == "__main__":
     print()
     
     # Run the agent
+    worker_load = WorkerLoad(load_limits)
     cli.run_app(
         WorkerOptions(
-            entrypoint_fnc=entrypoint
+            entrypoint_fnc=entrypoint,
+            prewarm_fnc=prewarm,
+            # Jobs share this process, and with it the client pool
+            job_executor_type=JobExecutorType.THREAD,
+            request_fnc=worker_load.request_fnc,
+            load_fnc=worker_load.compute_load,
+            load_threshold=load_limits.load_threshold,
         )
     )
\ No newline at end of file
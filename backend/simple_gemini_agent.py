@@ -1,9 +1,13 @@
 
 import logging
 import os
+import time
 from dotenv import load_dotenv
-from livekit.agents import Agent, AgentSession, JobContext, WorkerOptions, cli
+from livekit.agents import Agent, AgentSession, JobContext, JobExecutorType, JobProcess, WorkerOptions, cli
 from livekit.plugins import deepgram, google, cartesia, silero
+from client_pool import pool
+from load_control import JobLoadMonitor, LoadLimits, WorkerLoad
+from context_manager import ContextBudget, ContextWindowManager
 
 # Load environment
 load_dotenv()
@@ -12,22 +16,28 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("free-gemini-agent")
 
+# Worker capacity limits (AGENT_MAX_SESSIONS, AGENT_MAX_LOOP_LAG_MS, ... in .env)
+load_limits = LoadLimits.from_env()
+
 
 class FreeGeminiAssistant(Agent):
     """Free Voice Assistant using Deepgram + Gemini + Cartesia"""
     
     def __init__(self) -> None:
+        # STT/LLM/TTS hold this job's event-loop state (connections, streams),
+        # so they are per session; their HTTP goes through the pool's traced session
+        
         # Deepgram STT (Speech-to-Text)
-        stt = deepgram.STT()
+        stt = deepgram.STT(http_session=pool.http_session())
         
         # Gemini LLM
         llm = google.LLM(model="gemini-2.0-flash-exp")
         
         # Cartesia TTS (Text-to-Speech)
-        tts = cartesia.TTS()
+        tts = cartesia.TTS(http_session=pool.http_session())
         
-        # Silero VAD (Voice Activity Detection)
-        vad = silero.VAD.load()
+        # Silero VAD (Voice Activity Detection), shared by every session
+        vad = pool.get("silero_vad", silero.VAD.load)
         
         super().__init__(
             instructions="""
@@ -38,14 +48,38 @@ class FreeGeminiAssistant(Agent):
             tts=tts,
             vad=vad,
         )
+        
+        # Token-budgeted chat history for long calls
+        self.context_window = ContextWindowManager(
+            ContextBudget(max_tokens=4000, keep_recent_turns=6),
+            name="free-gemini",
+        )
+    
+    async def llm_node(self, chat_ctx, tools, model_settings):
+        """Send only the compacted context window to the LLM"""
+        chat_ctx = self.context_window.maybe_compact(chat_ctx) or chat_ctx
+        async for chunk in Agent.default.llm_node(self, chat_ctx, tools, model_settings):
+            yield chunk
+
+
+def prewarm(proc: JobProcess):
+    """Load the VAD model once per worker process, before the first job arrives"""
+    pool.get("silero_vad", silero.VAD.load)
 
 
 async def entrypoint(ctx: JobContext):
     """Main entry point for the agent"""
     
+    job_started = time.time()
     logger.info(f"Agent connecting to room: {ctx.room.name}")
+    ctx.add_shutdown_callback(pool.aclose)
+    
+    # Report this job's event-loop lag / RAG load to the worker
+    load_monitor = JobLoadMonitor(load_limits)
+    await load_monitor.start()
+    ctx.add_shutdown_callback(load_monitor.aclose)
     
-    # Connect to the room
+    # Connect to the room (the session prewarms the STT/TTS connections on start)
     await ctx.connect()
     logger.info("Connected to room")
     
@@ -59,6 +93,7 @@ async def entrypoint(ctx: JobContext):
     )
     
     logger.info("Free voice assistant is ready!")
+    logger.info(f"Client pool (this worker process): {pool.stats(since=job_started)}")
 
 
 if __name__ == "__main__":
@@ -105,8 +140,15 @@ if __name__ == "__main__":
     print()
     
     # Run the agent
+    worker_load = WorkerLoad(load_limits)
     cli.run_app(
         WorkerOptions(
-            entrypoint_fnc=entrypoint
+            entrypoint_fnc=entrypoint,
+            prewarm_fnc=prewarm,
+            # Jobs share this process, and with it the client pool
+            job_executor_type=JobExecutorType.THREAD,
+            request_fnc=worker_load.request_fnc,
+            load_fnc=worker_load.compute_load,
+            load_threshold=load_limits.load_threshold,
         )
     )
\ No newline at end of file
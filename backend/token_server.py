@@ -96,12 +96,12 @@ def upload_file():
         
         print(f"✅ File uploaded: {filepath}")
         
-        # Trigger RAG rebuild
+        # Trigger RAG update (incremental with the sqlite docstore)
         try:
-            from rag_llamaindex import build_index
-            print("🔄 Rebuilding RAG index...")
-            build_index(force_rebuild=True)
-            print("✅ RAG index rebuilt")
+            from rag_llamaindex import add_document
+            print("🔄 Updating RAG index...")
+            add_document(filepath)
+            print("✅ RAG index updated")
             
             return jsonify({
                 'success': True,